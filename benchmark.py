@@ -0,0 +1,386 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+# Synthetic vocabulary: (condition text, ICD-10-CM code)
+CONDITIONS = [
+    ("Breast cancer", "C50.9"), ("Melanoma", "C43.9"), ("Non-small cell lung cancer", "C34.90"),
+    ("Heart failure", "I50.9"), ("Hypertension", "I10"), ("Asthma", "J45.909"),
+    ("COPD", "J44.9"), ("Type 2 diabetes", "E11.9"), ("Obesity", "E66.9"),
+    ("Chronic kidney disease", "N18.9"), ("Major depressive disorder", "F32.9"),
+    ("Anemia", "D64.9"), ("Nicotine dependence", "F17.210"), ("Chronic cough", "R05.9"),
+]
+CATEGORIES = ["Condition", "Medication", "Laboratory", "Age", "Lifestyle", "Other"]
+CODED_CATEGORIES = ("Condition", "Medication", "Other")
+
+class FakeRateLimitError(Exception):
+    """Mimics the Groq 429 body so the usual 'try again in Xs' parsing applies."""
+    def __init__(self, wait):
+        super().__init__(
+            f"Error code: 429 - {{'error': {{'message': 'Rate limit reached. "
+            f"Please try again in {wait:.3f}s.', 'code': 'rate_limit_exceeded'}}}}"
+        )
+
+class FakeHTTPError(Exception):
+    pass
+
+class LatencyModel:
+    """Sleeps for a jittered latency and decides when a call gets rate limited."""
+    def __init__(self, rng, latency, rate_limit_ratio, retry_after):
+        self.rng = rng
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.rate_limited = 0
+
+    def wait(self):
+        if self.latency > 0:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.latency)
+        if self.rng.random() < self.rate_limit_ratio:
+            self.rate_limited += 1
+            return True
+        return False
+
+# --- FAKE LLM (stands in for processor.client) ---
+class FakeCompletions:
+    def __init__(self, model, metrics, processor):
+        self.model = model
+        self.metrics = metrics
+        self.processor = processor
+
+    def create(self, model, response_model, messages, max_retries=1, **kwargs):
+        self.metrics.record_llm_attempt()
+        if self.model.wait():
+            raise FakeRateLimitError(self.model.retry_after)
+
+        prompt = " ".join(m["content"] for m in messages)
+        text = messages[-1]["content"]
+        if response_model is self.processor.ICD10Result:
+            result = response_model(codes=self._codes_for(text))
+        else:
+            result = response_model(items=self._criteria_for(text))
+
+        # Roughly 4 characters per token, which is close enough for relative comparisons
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(result.model_dump_json()) // 4)
+        self.metrics.record_llm_usage(SimpleNamespace(usage=usage))
+        return result
+
+    def _codes_for(self, text):
+        lowered = text.lower()
+        codes = [code for name, code in CONDITIONS if name.lower() in lowered]
+        return codes or [CONDITIONS[zlib.crc32(text.encode()) % len(CONDITIONS)][1]]
+
+    def _criteria_for(self, text):
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line.startswith("- "):
+                continue
+            codes = self._codes_for(line)
+            items.append(self.processor.Criterion(
+                category="Condition",
+                type="Inclusion",
+                entity=line[2:40],
+                icd10_code=codes[0],
+                value=line[2:],
+            ))
+        return items
+
+class FakeLLMClient:
+    def __init__(self, model, metrics, processor):
+        self.chat = SimpleNamespace(completions=FakeCompletions(model, metrics, processor))
+
+# --- FAKE HTTP (stands in for api_client.requests) ---
+class FakeResponse:
+    def __init__(self, url, status_code, payload=None):
+        self.url = url
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise FakeHTTPError(f"{self.status_code} Client Error: Too Many Requests for url: {self.url}")
+
+    def json(self):
+        return self._payload
+
+class FakeRequests:
+    def __init__(self, model, ingest_ids, criteria_per_trial):
+        self.model = model
+        self.ingest_ids = ingest_ids
+        self.criteria_per_trial = criteria_per_trial
+
+    def get(self, url, params=None, **kwargs):
+        if self.model.wait():
+            return FakeResponse(url, 429)
+
+        if url.endswith("/studies"):
+            page_size = int((params or {}).get("pageSize", 10))
+            studies = [
+                {"protocolSection": {"identificationModule": {"nctId": nct_id}}}
+                for nct_id in self.ingest_ids[:page_size]
+            ]
+            return FakeResponse(url, 200, {"studies": studies})
+
+        nct_id = url.rsplit("/", 1)[-1]
+        rng = random.Random(nct_id)
+        inclusion = [f"- {rng.choice(CONDITIONS)[0]} confirmed by a physician" for _ in range(self.criteria_per_trial)]
+        exclusion = [f"- {rng.choice(CONDITIONS)[0]} within the last 6 months" for _ in range(self.criteria_per_trial // 2)]
+        criteria = "Inclusion Criteria:\n" + "\n".join(inclusion) + "\n\nExclusion Criteria:\n" + "\n".join(exclusion)
+        return FakeResponse(url, 200, {
+            "protocolSection": {
+                "identificationModule": {"officialTitle": f"Synthetic study {nct_id}"},
+                "eligibilityModule": {"eligibilityCriteria": criteria},
+            }
+        })
+
+# --- SYNTHETIC CORPUS ---
+def synthetic_rows(rng, n_trials, per_trial, unmapped):
+    """Yields (trial, criteria) rows; the first `unmapped` coded criteria are left for enrichment."""
+    left_unmapped = unmapped
+    for i in range(n_trials):
+        nct_id = f"NCT{i:08d}"
+        lines, items = [], []
+        for _ in range(per_trial):
+            name, code = rng.choice(CONDITIONS)
+            category = rng.choice(CATEGORIES)
+            kind = "Inclusion" if rng.random() < 0.6 else "Exclusion"
+            value = f"{name} ({category.lower()} criterion)"
+            if category in CODED_CATEGORIES and left_unmapped > 0:
+                code = None
+                left_unmapped -= 1
+            elif category not in CODED_CATEGORIES:
+                code = None
+            lines.append(f"- {value}")
+            items.append({
+                "trial_id": nct_id, "type": kind, "category": category, "entity": name,
+                "icd10_code": code, "operator": "NOT_APPLICABLE", "value": value,
+            })
+        trial = {"nct_id": nct_id, "title": f"Synthetic study {nct_id}", "criteria_raw": "\n".join(lines)}
+        yield trial, items
+
+def seed_corpus(database, rng, n_trials, per_trial, unmapped, batch_size=5000, engine=None):
+    """Bulk-inserts the synthetic corpus with Core inserts (the ORM path is benchmarked separately)."""
+    trials, items, total_items = [], [], 0
+    with (engine or database.engine).begin() as conn:
+        for trial, criteria in synthetic_rows(rng, n_trials, per_trial, unmapped):
+            trials.append(trial)
+            items.extend(criteria)
+            if len(trials) >= batch_size:
+                conn.execute(database.Trial.__table__.insert(), trials)
+                conn.execute(database.CriteriaItem.__table__.insert(), items)
+                total_items += len(items)
+                trials, items = [], []
+        if trials:
+            conn.execute(database.Trial.__table__.insert(), trials)
+            conn.execute(database.CriteriaItem.__table__.insert(), items)
+            total_items += len(items)
+    return total_items
+
+# --- HELPERS ---
+def git_version():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+def run_phase(results, name, metrics, fn):
+    """Runs one benchmark phase with stdout silenced and records its timing and metrics."""
+    metrics.reset()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        ops = fn()
+    seconds = time.perf_counter() - start
+
+    snap = metrics.snapshot()
+    results[name] = {
+        "seconds": round(seconds, 4),
+        "ops": ops,
+        "ops_per_second": round(ops / seconds, 2) if seconds > 0 else None,
+        "stages": {stage: {k: v for k, v in s.items() if k != "buckets"} for stage, s in snap["stages"].items()},
+        "counters": snap["counters"],
+    }
+    print(f"   {name:<10} {seconds:>9.3f}s  {ops:>9} ops  {results[name]['ops_per_second'] or 0:>10.1f} ops/s")
+
+def compare(current, baseline_path, threshold):
+    """Prints per-phase deltas against an earlier result file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n📊 Compared with {baseline.get('version')} ({baseline_path}):")
+    regressions = 0
+    for name, phase in current["phases"].items():
+        old = baseline.get("phases", {}).get(name)
+        if not old or not old.get("seconds"):
+            continue
+        delta = (phase["seconds"] - old["seconds"]) / old["seconds"] * 100
+        flag = "⚠️  REGRESSION" if delta > threshold else ""
+        regressions += bool(flag)
+        print(f"   {name:<10} {old['seconds']:>9.3f}s -> {phase['seconds']:>9.3f}s ({delta:+.1f}%) {flag}")
+    return regressions
+
+# --- MAIN ---
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark TrialIntel against a synthetic corpus with fake LLM/API calls.")
+    p.add_argument("--trials", type=int, default=1000,
+                   help="Synthetic trials seeded into the temp database for the seed, enrich and audit phases")
+    p.add_argument("--criteria-per-trial", type=int, default=8)
+    p.add_argument("--ingest", type=int, default=50, help="Trials pushed through fetch -> parse -> save")
+    p.add_argument("--enrich", type=int, default=200, help="Criteria left without an ICD-10 code for enrichment")
+    p.add_argument("--queries", type=int, default=20, help="Patient match queries to run")
+    p.add_argument("--match-trials", type=int, default=2000,
+                   help="Trials the match phase ranks against; matching cost grows roughly with the square "
+                        "of this, so keep it to a few thousand")
+    p.add_argument("--llm-latency", type=float, default=0.02, help="Mean fake LLM latency in seconds")
+    p.add_argument("--http-latency", type=float, default=0.01, help="Mean fake HTTP latency in seconds")
+    p.add_argument("--rate-limit-ratio", type=float, default=0.02, help="Share of fake calls answered with a 429")
+    p.add_argument("--retry-after", type=float, default=0.05, help="Seconds a fake 429 asks the caller to wait")
+    p.add_argument("--max-attempts", type=int, default=5)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--output", default="benchmark_results", help="Folder for result JSON files")
+    p.add_argument("--baseline", help="Earlier result JSON to compare against")
+    p.add_argument("--threshold", type=float, default=10.0, help="Slowdown in %% reported as a regression")
+    p.add_argument("--keep-db", action="store_true", help="Leave the temp database on disk")
+    return p.parse_args(argv)
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="trialintel-bench-")
+    # Must be set before the pipeline modules are imported: they build engines/clients at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["METRICS_DIR"] = os.path.join(workdir, "metrics")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark-fake-key")
+
+    import metrics
+    import database
+    import processor
+    import api_client
+    import main as ingest
+    import enrich_data
+    import patient_matcher
+    import check_data
+    from worker import get_wait_time
+
+    rng = random.Random(args.seed)
+    ingest_ids = [f"NCTB{i:07d}" for i in range(args.ingest)]
+    llm = LatencyModel(random.Random(args.seed + 1), args.llm_latency, args.rate_limit_ratio, args.retry_after)
+    http = LatencyModel(random.Random(args.seed + 2), args.http_latency, args.rate_limit_ratio, args.retry_after)
+    processor.client = FakeLLMClient(llm, metrics, processor)
+    api_client.requests = FakeRequests(http, ingest_ids, args.criteria_per_trial)
+
+    # rank_trials runs one exclusion query per matched trial and prefix, so the match phase
+    # gets its own copy of the first --match-trials trials instead of the full corpus
+    match_trials = min(args.match_trials, args.trials)
+    match_engine = database.engine
+
+    print(f"\n⏱  Benchmarking {args.trials} trials x {args.criteria_per_trial} criteria in {workdir}")
+    print(f"   (match phase ranks against the first {match_trials} trials)")
+    phases = {}
+
+    def seed():
+        database.init_db()
+        with metrics.timed("db.seed"):
+            return seed_corpus(database, rng, args.trials, args.criteria_per_trial, args.enrich)
+
+    def ingestion():
+        done = 0
+        for nct_id in ingest_ids:
+            for attempt in range(args.max_attempts):
+                try:
+                    if ingest.ingest_trial(nct_id):
+                        done += 1
+                        break
+                    metrics.inc("http_retries", stage="ingest.trial")
+                    time.sleep(args.retry_after)
+                except FakeRateLimitError as e:
+                    metrics.inc("rate_limit_waits", stage="ingest.trial")
+                    time.sleep(get_wait_time(str(e)))
+        return done
+
+    def enrichment():
+        enrich_data.enrich_metadata()
+        # Fake 429s are swallowed by get_icd10_codes, so count only what was actually mapped
+        return metrics.snapshot()["counters"].get("items_mapped", {}).get("enrich.item", 0)
+
+    def prepare_matching():
+        """Seeds the match subset outside the timed phase."""
+        nonlocal match_engine
+        if match_trials < args.trials:
+            match_engine = create_engine(f"sqlite:///{os.path.join(workdir, 'match.db')}")
+            database.Base.metadata.create_all(match_engine)
+            # Same seed, so this is an exact prefix of the main corpus (before enrichment)
+            seed_corpus(database, random.Random(args.seed), match_trials, args.criteria_per_trial,
+                        args.enrich, engine=match_engine)
+
+    def matching():
+        query_rng = random.Random(args.seed + 3)
+        codes = [code for _, code in CONDITIONS]
+        session = sessionmaker(bind=match_engine)()
+        try:
+            for _ in range(args.queries):
+                patient_codes = query_rng.sample(codes, query_rng.randint(1, 3))
+                with metrics.timed("match.query"):
+                    patient_matcher.rank_trials(session, patient_codes)
+        finally:
+            session.close()
+        return args.queries
+
+    def audit():
+        check_data.run_diagnostics()
+        return 1
+
+    try:
+        run_phase(phases, "seed", metrics, seed)
+        run_phase(phases, "ingest", metrics, ingestion)
+        run_phase(phases, "enrich", metrics, enrichment)
+        prepare_matching()
+        run_phase(phases, "match", metrics, matching)
+        run_phase(phases, "audit", metrics, audit)
+    finally:
+        if not args.keep_db:
+            database.engine.dispose()
+            match_engine.dispose()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "version": git_version(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "fake_rate_limits": {"llm": llm.rate_limited, "http": http.rate_limited},
+        "match_corpus_trials": match_trials,
+        "phases": phases,
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(args)
+
+    os.makedirs(args.output, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    out_path = os.path.join(args.output, f"bench_{result['version']}_{args.trials}_{stamp}.json")
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"✅ Results saved to {out_path}")
+
+    if args.baseline:
+        return 1 if compare(result, args.baseline, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
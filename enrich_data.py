@@ -5,6 +5,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from database import Session, CriteriaItem
 from processor import get_icd10_codes # Updated import
+import metrics
 
 def enrich_metadata():
     session = Session()
@@ -17,17 +18,24 @@ def enrich_metadata():
 
     for item in unmapped:
         print(f"🔍 Mapping: {item.value[:50]}...")
-        codes = get_icd10_codes(item.value)
+        with metrics.timed("enrich.item"):
+            codes = get_icd10_codes(item.value)
         
         if codes:
             item.icd10_code = codes[0]
+            metrics.inc("items_mapped", stage="enrich.item")
             print(f"✅ Assigned: {codes[0]}")
         else:
+            metrics.inc("items_unmapped", stage="enrich.item")
             print("⚠️ No code found.")
             
-    session.commit()
+    with metrics.timed("db.commit"):
+        session.commit()
     session.close()
     print("✨ Enrichment complete!")
 
+    metrics.print_summary()
+    metrics.flush("enrich")
+
 if __name__ == "__main__":
     enrich_metadata()
\ No newline at end of file
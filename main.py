@@ -7,6 +7,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from api_client import fetch_trial_data
 from processor import parse_criteria
 from database import init_db, save_structured_trial
+import metrics
 
 TRIAL_LIST = [
     "NCT03529110", "NCT05894954", "NCT02485626", "NCT06589310", "NCT03688126"
@@ -17,41 +18,54 @@ def run_batch():
     for nct_id in TRIAL_LIST:
         print(f"\n🚀 Processing {nct_id}...")
         try:
-            trial = fetch_trial_data(nct_id)
-            if not trial: continue
-            
-            raw_text = trial['criteria']
-            
-            # 1. Split text to find the Exclusion section
-            # ClinicalTrials.gov usually uses 'Exclusion Criteria:' as a header
-            parts = raw_text.split("Exclusion Criteria:")
-            
-            inc_text = parts[0]
-            exc_text = parts[1] if len(parts) > 1 else ""
-
-            # 2. Process both sections separately
-            print(f"   Parsing Inclusion...")
-            structured_inc = parse_criteria(inc_text)
-            
-            # Force the type to 'Exclusion' for the second pass
-            structured_exc = None
-            if exc_text:
-                print(f"   Parsing Exclusion...")
-                structured_exc = parse_criteria(exc_text)
-                for item in structured_exc.items:
-                    item.type = "Exclusion"
-
-            # 3. Combine and Save
-            if structured_exc:
-                structured_inc.items.extend(structured_exc.items)
-            
-            save_structured_trial(trial, structured_inc)
-            
-            print(f"✅ Successfully ingested: {trial['title'][:50]}...")
+            with metrics.timed("ingest.trial", nct_id=nct_id):
+                saved = ingest_trial(nct_id)
+            # A failed fetch returns False rather than raising, so timed() still sees ok=True
+            if not saved:
+                metrics.inc("trials_failed", stage="ingest.trial")
+                print(f"❌ Could not fetch {nct_id}")
             time.sleep(1) 
             
         except Exception as e:
             print(f"❌ Failed {nct_id}: {e}")
 
+    metrics.print_summary()
+    json_path, prom_path = metrics.flush("ingest")
+    print(f"📈 Metrics written to {json_path} and {prom_path}")
+
+def ingest_trial(nct_id):
+    trial = fetch_trial_data(nct_id)
+    if not trial: return False
+    
+    raw_text = trial['criteria']
+    
+    # 1. Split text to find the Exclusion section
+    # ClinicalTrials.gov usually uses 'Exclusion Criteria:' as a header
+    parts = raw_text.split("Exclusion Criteria:")
+    
+    inc_text = parts[0]
+    exc_text = parts[1] if len(parts) > 1 else ""
+
+    # 2. Process both sections separately
+    print(f"   Parsing Inclusion...")
+    structured_inc = parse_criteria(inc_text)
+    
+    # Force the type to 'Exclusion' for the second pass
+    structured_exc = None
+    if exc_text:
+        print(f"   Parsing Exclusion...")
+        structured_exc = parse_criteria(exc_text)
+        for item in structured_exc.items:
+            item.type = "Exclusion"
+
+    # 3. Combine and Save
+    if structured_exc:
+        structured_inc.items.extend(structured_exc.items)
+    
+    save_structured_trial(trial, structured_inc)
+    
+    print(f"✅ Successfully ingested: {trial['title'][:50]}...")
+    return True
+
 if __name__ == "__main__":
     run_batch()
\ No newline at end of file
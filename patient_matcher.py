@@ -5,22 +5,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from database import Session, CriteriaItem, Trial
 from processor import get_icd10_codes 
+import metrics
 
-def match_patient():
-    print("\n" + "="*60)
-    print("🧠 CLINICAL TRIAL INTELLIGENCE ENGINE (Ranked)")
-    print("="*60)
-    
-    query = input("Describe the patient: ")
-    patient_codes = get_icd10_codes(query)
-    
-    if not patient_codes:
-        print("❌ Could not identify any medical codes.")
-        return
-
+def rank_trials(session, patient_codes):
+    """Scores every trial against the patient's ICD-10 codes, best match first."""
     # Filter to unique 3-char families (e.g., C50, I42) to avoid redundant searches
     unique_prefixes = sorted(list(set(code[:3] for code in patient_codes)))
-    session = Session()
     
     # Store results in a dictionary for easy scoring and grouping
     # trial_id -> { "trial": Trial object, "matches": [List of Criteria], "score": int, "alerts": [List of strings] }
@@ -28,10 +18,11 @@ def match_patient():
 
     for prefix in unique_prefixes:
         # Search all categories (including 'Other') for inclusion criteria matching the code family
-        matches = session.query(CriteriaItem, Trial).join(Trial).filter(
-            CriteriaItem.type == 'Inclusion',
-            CriteriaItem.icd10_code.ilike(f"{prefix}%")
-        ).all()
+        with metrics.timed("db.match_inclusion"):
+            matches = session.query(CriteriaItem, Trial).join(Trial).filter(
+                CriteriaItem.type == 'Inclusion',
+                CriteriaItem.icd10_code.ilike(f"{prefix}%")
+            ).all()
         
         for item, trial in matches:
             if trial.nct_id not in scored_results:
@@ -61,11 +52,12 @@ def match_patient():
     # We check every trial found for potential exclusions based on ALL patient codes
     for nct_id, data in scored_results.items():
         for p_prefix in unique_prefixes:
-            exclusion = session.query(CriteriaItem).filter(
-                CriteriaItem.trial_id == nct_id,
-                CriteriaItem.type == 'Exclusion',
-                CriteriaItem.icd10_code.ilike(f"{p_prefix}%")
-            ).first()
+            with metrics.timed("db.match_exclusion"):
+                exclusion = session.query(CriteriaItem).filter(
+                    CriteriaItem.trial_id == nct_id,
+                    CriteriaItem.type == 'Exclusion',
+                    CriteriaItem.icd10_code.ilike(f"{p_prefix}%")
+                ).first()
             
             if exclusion:
                 data["alerts"].append(f"Excludes {p_prefix}: {exclusion.value[:80]}...")
@@ -73,34 +65,55 @@ def match_patient():
                 data["score"] -= 100 
 
     # Sort results by score (highest relevance first)
-    sorted_trials = sorted(scored_results.values(), key=lambda x: x["score"], reverse=True)
+    return sorted(scored_results.values(), key=lambda x: x["score"], reverse=True)
+
+def match_patient():
+    print("\n" + "="*60)
+    print("🧠 CLINICAL TRIAL INTELLIGENCE ENGINE (Ranked)")
+    print("="*60)
+    
+    # Flush even on the early return so the ICD-10 lookup's LLM call is still exported
+    try:
+        query = input("Describe the patient: ")
+        patient_codes = get_icd10_codes(query)
+    
+        if not patient_codes:
+            print("❌ Could not identify any medical codes.")
+            return
+
+        session = Session()
+        sorted_trials = rank_trials(session, patient_codes)
 
-    # OUTPUT RESULTS
-    for result in sorted_trials:
-        trial = result["trial"]
-        score = result["score"]
+        # OUTPUT RESULTS
+        for result in sorted_trials:
+            trial = result["trial"]
+            score = result["score"]
         
-        # Determine status color/icon based on score
-        status_icon = "⭐" if score > 0 else "🚫"
+            # Determine status color/icon based on score
+            status_icon = "⭐" if score > 0 else "🚫"
         
-        print(f"\n{status_icon} RANKING SCORE: {score}")
-        print(f"🆔 {trial.nct_id}: {trial.title}")
+            print(f"\n{status_icon} RANKING SCORE: {score}")
+            print(f"🆔 {trial.nct_id}: {trial.title}")
         
-        # Print the inclusion highlights
-        for m in result["matches"]:
-            print(f"   🔹 Matched Inclusion: {m.value[:100]}...")
+            # Print the inclusion highlights
+            for m in result["matches"]:
+                print(f"   🔹 Matched Inclusion: {m.value[:100]}...")
 
-        # Print safety alerts if any
-        if result["alerts"]:
-            for alert in result["alerts"]:
-                print(f"   ⚠️  SAFETY ALERT: {alert}")
+            # Print safety alerts if any
+            if result["alerts"]:
+                for alert in result["alerts"]:
+                    print(f"   ⚠️  SAFETY ALERT: {alert}")
         
-        print("-" * 60)
+            print("-" * 60)
 
-    if not sorted_trials:
-        print("😔 No trial matches found in the current database.")
+        if not sorted_trials:
+            print("😔 No trial matches found in the current database.")
 
-    session.close()
+        session.close()
+    finally:
+        metrics.print_summary()
+        json_path, prom_path = metrics.flush("match")
+        print(f"📈 Metrics written to {json_path} and {prom_path}")
 
 if __name__ == "__main__":
     match_patient()
\ No newline at end of file
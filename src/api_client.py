@@ -2,12 +2,17 @@ import requests
 import os
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
 BASE_URL = os.getenv("CT_API_BASE_URL", "https://clinicaltrials.gov/api/v2")
 
-def search_trials_by_condition(condition, max_results=10):  # Increased default to 10
-    """Fetches a list of NCT IDs for a specific condition."""
+def search_trials_by_condition(condition, max_results=10, raise_errors=False):  # Increased default to 10
+    """Fetches a list of NCT IDs for a specific condition.
+
+    Errors are logged and give an empty list unless raise_errors is set, so callers
+    that need to tell "nothing matched" from "search failed" can opt in."""
     search_url = f"{BASE_URL}/studies"
     params = {
         "query.cond": condition,
@@ -17,7 +22,8 @@ def search_trials_by_condition(condition, max_results=10):  # Increased default
     }
     
     try:
-        response = requests.get(search_url, params=params)
+        with metrics.timed("http.search"):
+            response = requests.get(search_url, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -30,6 +36,8 @@ def search_trials_by_condition(condition, max_results=10):  # Increased default
         return nct_ids
     except Exception as e:
         print(f"❌ Error searching API: {e}")
+        if raise_errors:
+            raise
         return []
 
 def fetch_trial_data(nct_id: str):
@@ -37,7 +45,8 @@ def fetch_trial_data(nct_id: str):
     url = f"{BASE_URL}/studies/{nct_id}"
     
     try:
-        response = requests.get(url)
+        with metrics.timed("http.fetch_trial"):
+            response = requests.get(url)
         response.raise_for_status()
         data = response.json()
         
@@ -1,9 +1,6 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine
-import time
-import datetime
-import re
 import sys
 import os
 
@@ -15,8 +12,11 @@ project_root = os.path.dirname(current_dir)
 # Define the absolute path to trials.db
 db_path = os.path.join(project_root, "trials.db")
 
+# Point the shared database module (and so the job queue) at the same file
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{db_path}")
+
 # Create a SINGLE engine instance using the absolute path
-engine = create_engine(f"sqlite:///{db_path}")
+engine = create_engine(os.environ["DATABASE_URL"])
 
 if current_dir not in sys.path:
     sys.path.append(current_dir)
@@ -25,16 +25,15 @@ if current_dir not in sys.path:
 st.set_page_config(page_title="TrialIntel", layout="wide", page_icon="🧬")
 
 from processor import get_icd10_codes
+from database import init_db
+from job_queue import enqueue_job, get_jobs, queue_depth
 
 # --- 3. HELPER FUNCTIONS ---
-def get_wait_time(error_message):
-    match = re.search(r"again in (?:(\d+)h)?(?:(\d+)m)?([\d\.]+)s", error_message)
-    if match:
-        hrs = int(match.group(1)) if match.group(1) else 0
-        mins = int(match.group(2)) if match.group(2) else 0
-        secs = float(match.group(3))
-        return (hrs * 3600) + (mins * 60) + secs
-    return 60 
+@st.cache_resource
+def ensure_tables():
+    init_db()
+
+ensure_tables()
 
 def get_local_trials():
     try:
@@ -49,71 +48,64 @@ def get_trial_criteria(nct_id):
     except:
         return pd.DataFrame()
 
-def check_exists(nct_id):
-    try:
-        res = pd.read_sql("SELECT nct_id FROM trials WHERE nct_id = :id", engine, params={"id": nct_id})
-        return not res.empty
-    except:
-        return False
-
 # --- 4. SIDEBAR: DISCOVERY ---
 st.sidebar.title("🧬 Trial Discovery")
 
-if "cooldown_until" not in st.session_state:
-    st.session_state.cooldown_until = None
+if "my_jobs" not in st.session_state:
+    st.session_state.my_jobs = []
+if "finished_jobs" not in st.session_state:
+    st.session_state.finished_jobs = set()
 
-is_cooling_down = False
-if st.session_state.cooldown_until:
-    if datetime.datetime.now() < st.session_state.cooldown_until:
-        is_cooling_down = True
-    else:
-        st.session_state.cooldown_until = None
+search_query = st.sidebar.text_input("New API Search", placeholder="e.g. Melanoma")
+max_results = st.sidebar.slider("Max trials", min_value=1, max_value=100, value=5)
 
-search_query = st.sidebar.text_input("New API Search", placeholder="e.g. Melanoma", disabled=is_cooling_down)
-
-if st.sidebar.button("🔍 Fetch from Web", disabled=is_cooling_down):
+# Ingestion runs in worker.py; the app only queues the request and polls its progress
+if st.sidebar.button("🔍 Fetch from Web"):
     if not search_query:
         st.sidebar.warning("Please enter a condition.")
     else:
-        from api_client import search_trials_by_condition, fetch_trial_data
-        from processor import parse_criteria
-        from database import save_structured_trial
-        
-        status = st.sidebar.empty()
-        status.info(f"Searching web for '{search_query}'...")
-        
-        new_ids = search_trials_by_condition(search_query, max_results=5)
-        processed_count = 0
-        skipped_count = 0
-
-        for nct_id in new_ids:
-            if check_exists(nct_id):
-                skipped_count += 1
-                continue
-            
-            try:
-                status.text(f"Processing: {nct_id}...")
-                trial = fetch_trial_data(nct_id)
-                if trial:
-                    structured = parse_criteria(trial['criteria'])
-                    save_structured_trial(trial, structured)
-                    processed_count += 1
-                    time.sleep(1)
-            except Exception as e:
-                raw_err = str(e)
-                if "429" in raw_err or "rate_limit" in raw_err:
-                    total_seconds = get_wait_time(raw_err)
-                    st.session_state.cooldown_until = datetime.datetime.now() + datetime.timedelta(seconds=total_seconds)
-                    st.rerun()
-                else:
-                    st.sidebar.error(f"❌ Failed {nct_id}")
-                    with st.sidebar.expander("View Diagnostic Log"):
-                        st.code(raw_err)
-                break 
-
-        if processed_count > 0:
-            st.sidebar.success(f"Added {processed_count} new trials!")
-            st.rerun()
+        job_id = enqueue_job(search_query, max_results=max_results)
+        st.session_state.my_jobs.append(job_id)
+        st.sidebar.success(f"Queued job #{job_id} for '{search_query}'.")
+
+@st.fragment(run_every=3)
+def show_jobs():
+    jobs = get_jobs(st.session_state.my_jobs)
+    if not jobs:
+        return
+
+    st.subheader("📥 Ingestion Jobs")
+    st.caption(f"{queue_depth()} job(s) queued or running")
+
+    newly_finished = False
+    for job in jobs:
+        total = job["total"]
+        done = job["processed"] + job["skipped"] + job["failed"]
+        label = f"#{job['id']} '{job['query']}' ({job['status']})"
+
+        if job["status"] in ("queued", "running"):
+            st.progress(done / total if total else 0.0, text=label)
+        elif job["status"] == "done":
+            st.success(label)
+        else:
+            st.error(label)
+
+        if job["message"]:
+            st.caption(job["message"])
+        if job["error"]:
+            with st.expander("View Diagnostic Log"):
+                st.code(job["error"])
+
+        if job["status"] in ("done", "failed") and job["id"] not in st.session_state.finished_jobs:
+            st.session_state.finished_jobs.add(job["id"])
+            newly_finished = newly_finished or job["processed"] > 0
+
+    # Refresh the whole page once so new trials show up in the explorer (match results persist in session_state)
+    if newly_finished:
+        st.rerun(scope="app")
+
+with st.sidebar:
+    show_jobs()
 
 # --- 5. MAIN PAGE NAVIGATION ---
 tab1, tab2 = st.tabs(["🎯 Patient Matcher", "📂 Trial Database"])
@@ -123,7 +115,9 @@ with tab1:
     patient_desc = st.text_area("Enter Patient Medical Summary:", 
                                 placeholder="e.g. 65 year old female with HER2+ breast cancer.")
     
+    # Results live in session_state so the rerun after a finished ingestion job doesn't clear them
     if st.button("Calculate Matches"):
+        st.session_state.match_results = None
         if not patient_desc:
             st.warning("Please enter details first.")
         else:
@@ -133,8 +127,6 @@ with tab1:
             if not p_codes:
                 st.error("No medical codes identified.")
             else:
-                st.write(f"🧬 **Identified Codes:** {', '.join(p_codes)}")
-                
                 prefixes = list(set(c[:3] for c in p_codes))
                 
                 criteria_query = "SELECT * FROM criteria_items WHERE icd10_code IS NOT NULL"
@@ -167,27 +159,32 @@ with tab1:
                             scored_results[tid]["alerts"].append(f"Exclusion hit: {erow['value']}")
                             scored_results[tid]["score"] -= 100
 
-                # Display Results
                 ranked = sorted(scored_results.items(), key=lambda x: x[1]['score'], reverse=True)
+                st.session_state.match_results = {"codes": p_codes, "ranked": ranked}
+
+    # Display Results
+    results = st.session_state.get("match_results")
+    if results:
+        st.write(f"🧬 **Identified Codes:** {', '.join(results['codes'])}")
+        
+        if not results["ranked"]:
+            st.info("No matching trials found in the current database.")
+        
+        for tid, data in results["ranked"]:
+            with st.container(border=True):
+                c1, c2 = st.columns([4, 1])
+                c1.subheader(f"{tid}")
+                c2.metric("Score", data['score'])
                 
-                if not ranked:
-                    st.info("No matching trials found in the current database.")
+                if data['alerts']:
+                    for a in data['alerts']:
+                        st.error(f"⚠️ {a}")
                 
-                for tid, data in ranked:
-                    with st.container(border=True):
-                        c1, c2 = st.columns([4, 1])
-                        c1.subheader(f"{tid}")
-                        c2.metric("Score", data['score'])
-                        
-                        if data['alerts']:
-                            for a in data['alerts']:
-                                st.error(f"⚠️ {a}")
-                        
-                        st.write("**Matched Criteria:**")
-                        for m in data['matches'][:3]:
-                            st.markdown(f"- {m}")
-                        
-                        st.link_button("View Trial", f"https://clinicaltrials.gov/study/{tid}")
+                st.write("**Matched Criteria:**")
+                for m in data['matches'][:3]:
+                    st.markdown(f"- {m}")
+                
+                st.link_button("View Trial", f"https://clinicaltrials.gov/study/{tid}")
 
 with tab2:
     st.header("Saved Trial Explorer")
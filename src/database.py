@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine, Column, String, Integer, Text, ForeignKey
+import os
+from sqlalchemy import create_engine, Column, String, Integer, Text, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+import metrics
+
 Base = declarative_base()
 
 class Trial(Base):
@@ -21,8 +24,29 @@ class CriteriaItem(Base):
     operator = Column(String, nullable=True) # Added to match AI output
     value = Column(String)
 
-# Database Setup
-engine = create_engine("sqlite:///./trials.db")
+class IngestJob(Base):
+    __tablename__ = 'ingest_jobs'
+    id = Column(Integer, primary_key=True)
+    query = Column(String)
+    max_results = Column(Integer, default=5)
+    status = Column(String, default='queued', index=True) # queued -> running -> done / failed
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    message = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    worker = Column(String, nullable=True)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+# Database Setup (DATABASE_URL lets PostgreSQL or a scratch SQLite file replace the local default)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./trials.db")
+# The app and the ingest worker share the SQLite file, so wait on locks instead of failing fast
+connect_args = {"timeout": 30} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
 Session = sessionmaker(bind=engine)
 
 def init_db():
@@ -30,6 +54,12 @@ def init_db():
     print("Database initialized successfully.")
 
 def save_structured_trial(trial_data, structured_obj):
+    with metrics.timed("db.save_trial"):
+        _save_structured_trial(trial_data, structured_obj)
+    metrics.inc("trials_saved", stage="db.save_trial")
+    metrics.inc("criteria_saved", len(structured_obj.items), stage="db.save_trial")
+
+def _save_structured_trial(trial_data, structured_obj):
     session = Session()
     try:
         # 1. Save or Update the Trial header
@@ -56,7 +86,8 @@ def save_structured_trial(trial_data, structured_obj):
             )
             session.add(new_item)
             
-        session.commit()
+        with metrics.timed("db.commit"):
+            session.commit()
     except Exception as e:
         session.rollback()
         raise e
@@ -0,0 +1,114 @@
+import datetime
+
+from database import Session, IngestJob
+
+ACTIVE_STATUSES = ("queued", "running")
+
+def _now():
+    return datetime.datetime.now()
+
+def _as_dict(job):
+    """Plain snapshot of a job row so callers never hold a live session object."""
+    return {
+        "id": job.id,
+        "query": job.query,
+        "max_results": job.max_results,
+        "status": job.status,
+        "total": job.total or 0,
+        "processed": job.processed or 0,
+        "skipped": job.skipped or 0,
+        "failed": job.failed or 0,
+        "message": job.message,
+        "error": job.error,
+        "worker": job.worker,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+def enqueue_job(query, max_results=5):
+    """Adds a search-and-ingest request to the queue and returns its id."""
+    session = Session()
+    try:
+        job = IngestJob(query=query, max_results=max_results, status="queued",
+                        message="Waiting for a worker...", created_at=_now())
+        session.add(job)
+        session.commit()
+        return job.id
+    finally:
+        session.close()
+
+def claim_next_job(worker_id):
+    """Moves the oldest queued job to 'running' for this worker; None only when nothing is queued."""
+    session = Session()
+    try:
+        while True:
+            job = session.query(IngestJob).filter(IngestJob.status == "queued").order_by(IngestJob.id).first()
+            if job is None:
+                return None
+
+            # Conditional update: if another worker claimed it first, no row changes
+            now = _now()
+            claimed = session.query(IngestJob).filter(
+                IngestJob.id == job.id,
+                IngestJob.status == "queued"
+            ).update({
+                "status": "running", "worker": worker_id, "started_at": now, "updated_at": now,
+                "message": "Searching ClinicalTrials.gov..."
+            }, synchronize_session=False)
+            session.commit()
+
+            if claimed:
+                session.refresh(job)
+                return _as_dict(job)
+            # Lost the race for this one; try the next queued job
+    finally:
+        session.close()
+
+def update_job(job_id, **fields):
+    """Writes progress fields and bumps the heartbeat used to detect dead workers."""
+    session = Session()
+    try:
+        fields["updated_at"] = _now()
+        session.query(IngestJob).filter(IngestJob.id == job_id).update(fields, synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+def finish_job(job_id, status="done", message=None, error=None):
+    update_job(job_id, status=status, message=message, error=error, finished_at=_now())
+
+def requeue_stale_jobs(timeout_seconds=600):
+    """Puts 'running' jobs whose worker stopped reporting back in the queue."""
+    session = Session()
+    try:
+        cutoff = _now() - datetime.timedelta(seconds=timeout_seconds)
+        count = session.query(IngestJob).filter(
+            IngestJob.status == "running",
+            IngestJob.updated_at < cutoff
+        ).update({"status": "queued", "worker": None, "message": "Requeued after worker timeout"},
+                 synchronize_session=False)
+        session.commit()
+        return count
+    finally:
+        session.close()
+
+def get_jobs(job_ids):
+    """Returns the given jobs, newest first."""
+    if not job_ids:
+        return []
+    session = Session()
+    try:
+        jobs = session.query(IngestJob).filter(IngestJob.id.in_(job_ids)).order_by(IngestJob.id.desc()).all()
+        return [_as_dict(j) for j in jobs]
+    finally:
+        session.close()
+
+def queue_depth():
+    """Number of jobs not yet finished, across all users."""
+    session = Session()
+    try:
+        return session.query(IngestJob).filter(IngestJob.status.in_(ACTIVE_STATUSES)).count()
+    finally:
+        session.close()
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Where flush() writes its snapshot files (relative to the working directory)
+METRICS_DIR = os.getenv("METRICS_DIR", "./metrics")
+
+# Latency buckets in seconds: covers fast DB writes up to slow LLM retries
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Cap on raw event records kept for the JSON log; histograms keep counting past it
+MAX_EVENTS = int(os.getenv("METRICS_MAX_EVENTS", "10000"))
+
+_lock = threading.Lock()
+_started_at = time.time()
+_histograms = {}  # stage -> {"count", "sum", "min", "max", "buckets": [...]}
+_counters = {}    # (name, stage) -> float
+_events = []      # structured log records, one per observation
+_current_stage = ContextVar("current_stage", default=None)
+_llm_attempts = ContextVar("llm_attempts", default=None)  # [count] for the innermost llm_call()
+
+def current_stage():
+    """Innermost stage opened with timed() in this context, if any."""
+    return _current_stage.get()
+
+def observe(stage, seconds, **fields):
+    """Records one latency sample for a stage."""
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = {"count": 0, "sum": 0.0, "min": None, "max": None, "buckets": [0] * len(BUCKETS)}
+            _histograms[stage] = hist
+
+        hist["count"] += 1
+        hist["sum"] += seconds
+        hist["min"] = seconds if hist["min"] is None else min(hist["min"], seconds)
+        hist["max"] = seconds if hist["max"] is None else max(hist["max"], seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+
+        if len(_events) < MAX_EVENTS:
+            _events.append({"ts": time.time(), "stage": stage, "seconds": round(seconds, 6), **fields})
+
+def inc(name, amount=1, stage=None):
+    """Adds to a counter, optionally scoped to a stage (defaults to the current one)."""
+    stage = stage or current_stage() or "unscoped"
+    with _lock:
+        key = (name, stage)
+        _counters[key] = _counters.get(key, 0) + amount
+
+@contextmanager
+def timed(stage, **fields):
+    """Times the wrapped block; failures are still recorded, tagged with ok=False."""
+    token = _current_stage.set(stage)
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except Exception:
+        ok = False
+        raise
+    finally:
+        _current_stage.reset(token)
+        observe(stage, time.perf_counter() - start, ok=ok, **fields)
+
+def record_llm_usage(response):
+    """Counts prompt/completion tokens from a raw chat completion (one per attempt)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    inc("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+    inc("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+    inc("llm_requests")
+
+def record_llm_attempt(*_args, **_kwargs):
+    """Counts one request sent by instructor (hooked on 'completion:kwargs')."""
+    attempts = _llm_attempts.get()
+    if attempts is not None:
+        attempts[0] += 1
+
+@contextmanager
+def llm_call(stage, **fields):
+    """Times one LLM call; every attempt after the first (re-ask or API error) counts as a retry."""
+    attempts = [0]
+    token = _llm_attempts.set(attempts)
+    try:
+        with timed(stage, **fields):
+            yield
+    finally:
+        _llm_attempts.reset(token)
+        if attempts[0] > 1:
+            inc("llm_retries", attempts[0] - 1, stage=stage)
+
+def reset():
+    global _started_at
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _events.clear()
+        _started_at = time.time()
+
+def _quantile(hist, q):
+    """Upper bucket bound containing the q-th sample (Prometheus-style estimate)."""
+    if not hist["count"]:
+        return None
+    target = q * hist["count"]
+    for bound, cumulative in zip(BUCKETS, hist["buckets"]):
+        if cumulative >= target:
+            return bound
+    return hist["max"]
+
+def snapshot():
+    """Returns all metrics as a plain dict, including per-stage throughput."""
+    with _lock:
+        elapsed = max(time.time() - _started_at, 1e-9)
+        stages = {}
+        for stage, hist in _histograms.items():
+            stages[stage] = {
+                "count": hist["count"],
+                "sum_seconds": round(hist["sum"], 6),
+                "mean_seconds": round(hist["sum"] / hist["count"], 6),
+                "min_seconds": round(hist["min"], 6),
+                "max_seconds": round(hist["max"], 6),
+                "p50_seconds": _quantile(hist, 0.50),
+                "p95_seconds": _quantile(hist, 0.95),
+                "per_second": round(hist["count"] / elapsed, 4),
+                "buckets": dict(zip([str(b) for b in BUCKETS], hist["buckets"])),
+            }
+        counters = {}
+        for (name, stage), value in _counters.items():
+            counters.setdefault(name, {})[stage] = value
+
+        return {
+            "started_at": _started_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": stages,
+            "counters": counters,
+            "events": list(_events),
+        }
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_prometheus():
+    """Renders histograms and counters in the Prometheus text exposition format."""
+    lines = [
+        "# HELP trialintel_stage_seconds Latency of pipeline stages.",
+        "# TYPE trialintel_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage, hist in sorted(_histograms.items()):
+            lbl = f'stage="{_label(stage)}"'
+            for bound, cumulative in zip(BUCKETS, hist["buckets"]):
+                lines.append(f'trialintel_stage_seconds_bucket{{{lbl},le="{bound}"}} {cumulative}')
+            lines.append(f'trialintel_stage_seconds_bucket{{{lbl},le="+Inf"}} {hist["count"]}')
+            lines.append(f"trialintel_stage_seconds_sum{{{lbl}}} {hist['sum']:.6f}")
+            lines.append(f"trialintel_stage_seconds_count{{{lbl}}} {hist['count']}")
+
+        for name in sorted({n for n, _ in _counters}):
+            metric = f"trialintel_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (n, stage), value in sorted(_counters.items()):
+                if n == name:
+                    lines.append(f'{metric}{{stage="{_label(stage)}"}} {value}')
+
+    return "\n".join(lines) + "\n"
+
+def flush(prefix="pipeline", directory=None):
+    """Writes <prefix>_metrics.json and <prefix>_metrics.prom; returns both paths."""
+    directory = directory or METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f"{prefix}_metrics.json")
+    prom_path = os.path.join(directory, f"{prefix}_metrics.prom")
+
+    with open(json_path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+    with open(prom_path, "w") as f:
+        f.write(to_prometheus())
+    return json_path, prom_path
+
+def print_summary():
+    """Prints a short per-stage table, slowest total time first."""
+    stages = snapshot()["stages"]
+    if not stages:
+        return
+    print("\n" + "="*60)
+    print("⏱  PIPELINE TIMING")
+    print("="*60)
+    print(f"{'Stage':<28} | {'Count':>6} | {'Mean s':>8} | {'Total s':>8}")
+    for stage, s in sorted(stages.items(), key=lambda x: x[1]["sum_seconds"], reverse=True):
+        print(f"{stage:<28} | {s['count']:>6} | {s['mean_seconds']:>8.3f} | {s['sum_seconds']:>8.3f}")
+    print("="*60)
@@ -5,10 +5,17 @@ from typing import List, Optional, Literal, Annotated
 from pydantic import BaseModel, Field, field_validator, StringConstraints
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
 _base_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-client = instructor.patch(_base_client)
+client = instructor.from_groq(_base_client)
+
+# Every raw completion (including re-asks after a failed validation) reports its token usage
+client.on("completion:response", metrics.record_llm_usage)
+# Attempts are counted per call, so retries cover validation re-asks and API errors alike
+client.on("completion:kwargs", metrics.record_llm_attempt)
 
 class Criterion(BaseModel):
     category: str 
@@ -45,40 +52,42 @@ def parse_criteria(raw_text: str) -> StructuredCriteria:
     clean_text = raw_text.replace("¬", " ").replace("*", " ").replace("~", " ")
     safe_text = clean_text[:1200] 
 
-    return client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        response_model=StructuredCriteria,
-        max_retries=3,
-        messages=[
-            {
-                "role": "system", 
-                "content": (
-                    "You are a medical data architect. Extract items into ONE list.\n"
-                    "CRITICAL: Do not use special symbols like ¬ or ~. "
-                    "If you see complex scoring, summarize it into one sentence."
-                )
-            },
-            {"role": "user", "content": f"Extract: {safe_text}"}
-        ]
-    )
-
-class ICD10Result(BaseModel):
-    codes: List[str] = Field(description="List of specific ICD-10-CM codes (e.g., ['C50.9', 'C43.9'])")
-
-def get_icd10_codes(condition_text: str) -> List[str]:
-    """Specialized lookup that returns a list of medical codes."""
-    try:
-        response = client.chat.completions.create(
+    with metrics.llm_call("llm.parse_criteria"):
+        return client.chat.completions.create(
             model="llama-3.1-8b-instant",
-            response_model=ICD10Result,
+            response_model=StructuredCriteria,
+            max_retries=3,
             messages=[
                 {
                     "role": "system", 
-                    "content": "Professional medical coder. Extract ALL relevant ICD-10-CM codes. Output only the codes."
+                    "content": (
+                        "You are a medical data architect. Extract items into ONE list.\n"
+                        "CRITICAL: Do not use special symbols like ¬ or ~. "
+                        "If you see complex scoring, summarize it into one sentence."
+                    )
                 },
-                {"role": "user", "content": f"Conditions: {condition_text}"}
+                {"role": "user", "content": f"Extract: {safe_text}"}
             ]
         )
+
+class ICD10Result(BaseModel):
+    codes: List[str] = Field(description="List of specific ICD-10-CM codes (e.g., ['C50.9', 'C43.9'])")
+
+def get_icd10_codes(condition_text: str) -> List[str]:
+    """Specialized lookup that returns a list of medical codes."""
+    try:
+        with metrics.llm_call("llm.icd10_lookup"):
+            response = client.chat.completions.create(
+                model="llama-3.1-8b-instant",
+                response_model=ICD10Result,
+                messages=[
+                    {
+                        "role": "system", 
+                        "content": "Professional medical coder. Extract ALL relevant ICD-10-CM codes. Output only the codes."
+                    },
+                    {"role": "user", "content": f"Conditions: {condition_text}"}
+                ]
+            )
         return response.codes
     except Exception as e:
         print(f"Error during ICD-10 lookup: {e}")
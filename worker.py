@@ -0,0 +1,175 @@
+import argparse
+import os
+import re
+import socket
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+# Use the same database file as the Streamlit app, wherever the worker is started from
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(PROJECT_ROOT, 'trials.db')}")
+
+from api_client import search_trials_by_condition, fetch_trial_data
+from processor import parse_criteria
+from database import init_db, Session, Trial, save_structured_trial
+from job_queue import claim_next_job, update_job, finish_job, requeue_stale_jobs
+import metrics
+
+POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+TRIAL_DELAY = float(os.getenv("WORKER_TRIAL_DELAY", "1")) # Pause between trials to stay polite with the APIs
+MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF = float(os.getenv("WORKER_RETRY_BACKOFF", "5")) # First wait after a failed fetch, doubled per attempt
+MAX_WAIT = float(os.getenv("WORKER_MAX_WAIT", "300")) # Longer rate limits (e.g. daily quotas) fail the trial instead
+HEARTBEAT_SECONDS = 30 # Must stay well below --stale-after so waiting jobs are not requeued
+
+def get_wait_time(error_message):
+    """Parses Groq's 'try again in 1m2.5s' hint; defaults to 60 seconds."""
+    match = re.search(r"again in (?:(\d+)h)?(?:(\d+)m)?([\d\.]+)s", error_message)
+    if match:
+        hrs = int(match.group(1)) if match.group(1) else 0
+        mins = int(match.group(2)) if match.group(2) else 0
+        secs = float(match.group(3))
+        return (hrs * 3600) + (mins * 60) + secs
+    return 60
+
+def trial_exists(nct_id):
+    session = Session()
+    try:
+        return session.query(Trial.nct_id).filter(Trial.nct_id == nct_id).first() is not None
+    finally:
+        session.close()
+
+def ingest_trial(nct_id):
+    """Same single parse_criteria() pass over the full criteria text as the app's inline fetch did.
+
+    main.ingest_trial splits inclusion/exclusion into two LLM calls; the web path keeps one
+    call per trial so it doesn't double Groq usage or change what gets stored."""
+    trial = fetch_trial_data(nct_id)
+    if not trial:
+        return False
+    structured = parse_criteria(trial['criteria'])
+    save_structured_trial(trial, structured)
+    return True
+
+def wait_with_heartbeat(job_id, seconds, message):
+    """Sleeps in short slices, bumping the job's heartbeat so it isn't requeued as stale."""
+    deadline = time.monotonic() + seconds
+    with metrics.timed("worker.wait"):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            update_job(job_id, message=f"{message}, retrying in {remaining:.0f}s")
+            time.sleep(min(HEARTBEAT_SECONDS, remaining))
+
+def ingest_with_retry(job_id, nct_id):
+    """Ingests one trial, backing off on rate limits and failed fetches. Returns (saved, error message)."""
+    error = None
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            # Time each attempt on its own so backoff and rate-limit sleeps don't skew ingest latency
+            with metrics.timed("ingest.trial", nct_id=nct_id, attempt=attempt):
+                saved = ingest_trial(nct_id)
+            if saved:
+                return True, None
+            # fetch_trial_data swallows HTTP errors (429s included), so back off before trying again
+            metrics.inc("trials_failed", stage="ingest.trial")
+            error = f"Could not fetch {nct_id}"
+            if attempt < MAX_ATTEMPTS:
+                wait = min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_WAIT)
+                wait_with_heartbeat(job_id, wait, f"Could not fetch {nct_id} ({attempt}/{MAX_ATTEMPTS})")
+        except Exception as e:
+            error = str(e)
+            if "429" in error or "rate_limit" in error:
+                wait = get_wait_time(error)
+                if wait > MAX_WAIT:
+                    # Don't hold the queue for every other user while a long quota resets
+                    error = f"Rate limited for {wait:.0f}s (over the {MAX_WAIT:.0f}s cap): {error}"
+                    break
+                if attempt < MAX_ATTEMPTS:
+                    wait_with_heartbeat(job_id, wait, f"Rate limited on {nct_id} ({attempt}/{MAX_ATTEMPTS})")
+                    continue
+            break
+    return False, error
+
+def process_job(job):
+    job_id = job["id"]
+    print(f"\n📥 Job #{job_id}: '{job['query']}' (up to {job['max_results']} trials)")
+
+    try:
+        nct_ids = search_trials_by_condition(job["query"], max_results=job["max_results"], raise_errors=True)
+    except Exception as e:
+        finish_job(job_id, status="failed", message="Search failed", error=str(e))
+        print(f"❌ Job #{job_id} search failed: {e}")
+        return
+
+    processed = skipped = failed = 0
+    last_error = None
+    update_job(job_id, total=len(nct_ids), processed=0, skipped=0, failed=0,
+               message=f"Found {len(nct_ids)} trials" if nct_ids else "No trials found")
+
+    for nct_id in nct_ids:
+        if trial_exists(nct_id):
+            skipped += 1
+            update_job(job_id, skipped=skipped)
+            continue
+
+        update_job(job_id, message=f"Processing {nct_id}...")
+        print(f"\n🚀 Processing {nct_id}...")
+        saved, error = ingest_with_retry(job_id, nct_id)
+
+        # One bad trial should not abort the rest of the search
+        if saved:
+            processed += 1
+        else:
+            failed += 1
+            last_error = error
+            print(f"❌ Failed {nct_id}: {error}")
+        update_job(job_id, processed=processed, failed=failed)
+        time.sleep(TRIAL_DELAY)
+
+    # Skipped trials were never attempted, so they don't count towards a total failure
+    attempted = len(nct_ids) - skipped
+    status = "failed" if attempted and failed == attempted else "done"
+    finish_job(job_id, status=status, error=last_error,
+               message=f"Added {processed}, skipped {skipped}, failed {failed}")
+    print(f"✨ Job #{job_id} {status}: added {processed}, skipped {skipped}, failed {failed}")
+
+def run_worker(once=False, stale_after=600):
+    init_db()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    requeued = requeue_stale_jobs(stale_after)
+    if requeued:
+        print(f"♻️  Requeued {requeued} stale job(s).")
+    print(f"👷 Worker {worker_id} waiting for jobs...")
+
+    while True:
+        job = claim_next_job(worker_id)
+        if job is None:
+            # Check while idle too, so a job whose worker died mid-run doesn't wait for a restart
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                print(f"♻️  Requeued {requeued} stale job(s).")
+                continue
+            if once:
+                break
+            time.sleep(POLL_SECONDS)
+            continue
+
+        try:
+            with metrics.timed("worker.job"):
+                process_job(job)
+        except Exception as e:
+            finish_job(job["id"], status="failed", message="Worker error", error=str(e))
+            print(f"❌ Job #{job['id']} crashed: {e}")
+        metrics.flush("worker")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processes queued 'Fetch from Web' ingestion jobs.")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--stale-after", type=int, default=600,
+                        help="Seconds without progress before a running job is requeued")
+    args = parser.parse_args()
+    run_worker(once=args.once, stale_after=args.stale_after)